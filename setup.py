@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+"""Builds the optional _floodfill C accelerator for nanobanana_generate.py.
+
+Usage: python3 setup.py build_ext --inplace
+nanobanana_generate.py falls back to slower paths when it is not built.
+"""
+from setuptools import Extension, setup
+
+setup(
+    name="nanobanana-floodfill",
+    version="0.1.0",
+    ext_modules=[Extension("_floodfill", sources=["_floodfill.c"])],
+)